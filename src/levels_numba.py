@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+⚡ Swing-high / swing-low level detection (Numba kernel)
+"""
+
+import numpy as np
+
+try:
+    from numba import njit
+    HAVE_NUMBA = True
+except ImportError:  # Vectorised NumPy fallback when Numba is unavailable
+    HAVE_NUMBA = False
+
+    def njit(*args, **kwargs):
+        return lambda func: func
+
+
+@njit(cache=True)
+def _cluster(prices, count, tol):
+    """Merge sorted prices closer than `tol` (relative) into running means"""
+    levels = np.empty(count)
+    if count == 0:
+        return levels
+
+    prices = np.sort(prices[:count])
+    n_levels = 0
+    total = prices[0]
+    members = 1
+    for i in range(1, count):
+        mean = total / members
+        if abs(prices[i] - mean) < tol * mean:
+            total += prices[i]
+            members += 1
+        else:
+            levels[n_levels] = mean
+            n_levels += 1
+            total = prices[i]
+            members = 1
+    levels[n_levels] = total / members
+    return levels[:n_levels + 1]
+
+
+@njit(cache=True)
+def _swing_levels_jit(high, low, window, tol):
+    """Clustered swing lows (support) and swing highs (resistance)"""
+    n = high.shape[0]
+    peaks = np.empty(n)
+    troughs = np.empty(n)
+    n_peaks = 0
+    n_troughs = 0
+
+    for i in range(window, n - window):
+        # NaN bars (e.g. leading gaps ffill can't fill) are never levels
+        is_peak = np.isfinite(high[i])
+        is_trough = np.isfinite(low[i])
+        for j in range(i - window, i + window + 1):
+            if high[j] > high[i]:
+                is_peak = False
+            if low[j] < low[i]:
+                is_trough = False
+        if is_peak:
+            peaks[n_peaks] = high[i]
+            n_peaks += 1
+        if is_trough:
+            troughs[n_troughs] = low[i]
+            n_troughs += 1
+
+    return _cluster(troughs, n_troughs, tol), _cluster(peaks, n_peaks, tol)
+
+
+def _swing_levels_numpy(high, low, window, tol):
+    """Sliding-window equivalent of the JIT kernel for Numba-less installs"""
+    n = high.shape[0]
+    if n < 2 * window + 1:
+        return np.empty(0), np.empty(0)
+
+    from numpy.lib.stride_tricks import sliding_window_view
+    width = 2 * window + 1
+    mid_high = high[window:n - window]
+    mid_low = low[window:n - window]
+    is_peak = np.isfinite(mid_high) & ~(
+        sliding_window_view(high, width) > mid_high[:, None]).any(axis=1)
+    is_trough = np.isfinite(mid_low) & ~(
+        sliding_window_view(low, width) < mid_low[:, None]).any(axis=1)
+
+    peaks = mid_high[is_peak].astype(np.float64)
+    troughs = mid_low[is_trough].astype(np.float64)
+    return (_cluster(troughs, len(troughs), tol),
+            _cluster(peaks, len(peaks), tol))
+
+
+if HAVE_NUMBA:
+    swing_levels = _swing_levels_jit
+
+    # Warm the JIT at import so the first rerun doesn't pay compilation cost;
+    # pandas hands out read-only column arrays under copy-on-write
+    for _dtype in (np.float64, np.float32):
+        for _writeable in (True, False):
+            _dummy = np.zeros(2, _dtype)
+            _dummy.flags.writeable = _writeable
+            swing_levels(_dummy, _dummy, 1, 0.003)
+else:
+    swing_levels = _swing_levels_numpy
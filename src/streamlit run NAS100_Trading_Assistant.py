@@ -9,68 +9,170 @@ import numpy as np
 import sqlite3
 import smtplib
 import requests
+import time
+import concurrent.futures
 from datetime import datetime
 from email.message import EmailMessage
+from levels_numba import swing_levels
 
 # ======================
 # CORE TRADING ENGINE
 # ======================
 
+AV_FIELDS = {
+    '1. open': 'Open',
+    '2. high': 'High',
+    '3. low': 'Low',
+    '4. close': 'Close',
+    '5. volume': 'Volume'
+}
+
+# Narrow dtypes halve the bytes moved through level detection
+OHLCV_DTYPES = {
+    'Open': 'float32',
+    'High': 'float32',
+    'Low': 'float32',
+    'Close': 'float32',
+    'Volume': 'int32'
+}
+
+# Uploads may have blank cells: Volume is read as float64 (exact for any
+# realistic count, unlike float32) and narrowed to int32 after ffill
+CSV_DTYPES = {**OHLCV_DTYPES, 'Volume': 'float64'}
+
+# Common date column names, checked before scanning the CSV header
+DATE_COLUMNS = ('DateTime', 'Date', 'Timestamp', 'MarketTime',
+                'datetime', 'date', 'timestamp')
+
+# Timestamp layout of the starter CSV; skips per-row format inference
+CSV_DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# Pooled keep-alive connection to the market data API
+_SESSION = requests.Session()
+_SESSION.mount('https://', requests.adapters.HTTPAdapter(pool_connections=1,
+                                                         pool_maxsize=4))
+
+# Background workers so API latency doesn't block the script thread
+_POOL = concurrent.futures.ThreadPoolExecutor(max_workers=2)
+
+@st.cache_data(ttl=300, show_spinner=False)
+def _fetch_live_data(api_key, bucket):
+    """Intraday bars, cached per 5-minute bucket"""
+    response = _SESSION.get(
+        f"https://www.alphavantage.co/query?function=TIME_SERIES_INTRADAY"
+        f"&symbol=NDX&interval=5min&apikey={api_key}",
+        timeout=5
+    )
+    response.raise_for_status()
+    
+    payload = response.json()
+    time_series = payload.get("Time Series (5min)")
+    if not time_series:
+        # Rate limits and bad keys come back as HTTP 200 with a message;
+        # raising keeps them out of the cache
+        reason = (payload.get("Error Message") or payload.get("Note")
+                  or payload.get("Information") or "no time series returned")
+        raise ValueError(f"Alpha Vantage: {reason}")
+    bars = time_series.values()
+    df = pd.DataFrame(
+        {name: [bar[key] for bar in bars] for key, name in AV_FIELDS.items()},
+        index=pd.to_datetime(list(time_series))
+    ).astype(OHLCV_DTYPES)
+    
+    return df.sort_index()
+
+
+# Content hash for price arrays: reruns with unchanged data hit the cache
+_ARRAY_HASH = {np.ndarray: lambda a: (a.shape, a.dtype.str, hash(a.tobytes()))}
+
+@st.cache_data(show_spinner=False, max_entries=8, hash_funcs=_ARRAY_HASH)
+def _compute_levels(high, low, volume):
+    """Support/resistance levels for the given OHLC arrays"""
+    # Clustered swing lows/highs (±0.3% band)
+    support, resistance = swing_levels(high, low, 5, 0.003)
+    if len(support) and len(resistance):
+        return support.tolist(), resistance.tolist()
+    
+    # Fall back to a 50-bin volume profile of bar midpoints
+    # on monotonic or short series
+    mid = 0.5 * (high + low)
+    ok = np.isfinite(mid)
+    if not ok.any():
+        return [], []
+    mid = mid[ok]
+    edges = np.linspace(mid.min(), mid.max(), 51)
+    idx = np.clip(np.digitize(mid, edges) - 1, 0, 49)
+    vol = np.bincount(idx, weights=volume[ok].astype(np.float64), minlength=50)
+    centers = 0.5 * (edges[:-1] + edges[1:])
+    
+    support = centers[np.argpartition(vol, -3)[-3:]]
+    resistance = centers[np.argpartition(vol, 3)[:3]]
+    
+    return sorted(support.tolist()), sorted(resistance.tolist())
+
+
+DB_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS positions
+    (timestamp DATETIME, asset TEXT,
+     quantity REAL, entry_price REAL);
+CREATE TABLE IF NOT EXISTS audit_log
+    (timestamp DATETIME, action TEXT, details TEXT);
+'''
+
+INSERT_POSITION_SQL = "INSERT INTO positions VALUES (?,?,?,?)"
+
+SELECT_POSITIONS_SQL = ("SELECT timestamp, asset, quantity, entry_price "
+                        "FROM positions")
+
+@st.cache_resource
+def get_conn():
+    """Shared database connection, opened once per server process"""
+    conn = sqlite3.connect('trading_db.sqlite',
+                           check_same_thread=False,
+                           isolation_level=None)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.executescript(DB_SCHEMA)
+    return conn
+
+@st.cache_data(show_spinner=False, max_entries=1)
+def _load_positions(version):
+    """Positions table, re-read only when `version` changes"""
+    return pd.read_sql_query(SELECT_POSITIONS_SQL, get_conn(),
+                             parse_dates=['timestamp'])
+
+
 class TradingAssistant:
-    def __init__(self):
-        self.conn = sqlite3.connect('trading_db.sqlite')
-        self._init_db()
+    def __init__(self, conn):
+        self.conn = conn
         
-    def _init_db(self):
-        """Initialize database schema"""
-        with self.conn:
-            self.conn.execute('''CREATE TABLE IF NOT EXISTS positions
-                              (timestamp DATETIME, asset TEXT, 
-                               quantity REAL, entry_price REAL)''')
-            self.conn.execute('''CREATE TABLE IF NOT EXISTS audit_log
-                              (timestamp DATETIME, action TEXT, details TEXT)''')
+    def record_positions(self, positions):
+        """Persist (timestamp, asset, quantity, entry_price) rows"""
+        self.conn.executemany(INSERT_POSITION_SQL, positions)
+
+    def positions_version(self):
+        """Monotonic counter that advances with every recorded position"""
+        return self.conn.execute(
+            "SELECT COALESCE(MAX(rowid), 0) FROM positions"
+        ).fetchone()[0]
 
     def detect_levels(self, df):
         """Advanced support/resistance detection"""
         try:
-            df['Range'] = (df['High'] - df['Low']) * 0.5 + df['Low']
-            bins = pd.cut(df['Range'], bins=50, include_lowest=True)
-            
-            vol_profile = df.groupby(bins)['Volume'].sum().reset_index()
-            vol_profile['mid'] = vol_profile['Range'].apply(
-                lambda x: x.mid if isinstance(x, pd.Interval) else np.nan
-            ).astype(float)
-            
-            valid_profile = vol_profile.dropna()
-            support = valid_profile.nlargest(3, 'Volume')['mid'].values
-            resistance = valid_profile.nsmallest(3, 'Volume')['mid'].values
-            
-            return sorted(support), sorted(resistance)
+            return _compute_levels(df['High'].to_numpy(),
+                                   df['Low'].to_numpy(),
+                                   df['Volume'].to_numpy())
         
         except Exception as e:
             st.error(f"Technical analysis error: {str(e)}")
             return [], []
 
     def fetch_live_data(self):
-        """Secure market data feed"""
+        """Secure market data feed (returns a Future)"""
         try:
-            response = requests.get(
-                f"https://www.alphavantage.co/query?function=TIME_SERIES_INTRADAY"
-                f"&symbol=NDX&interval=5min&apikey={st.secrets['alpha_vantage']['api_key']}"
-            )
-            response.raise_for_status()
-            
-            time_series = response.json().get("Time Series (5min)", {})
-            df = pd.DataFrame(time_series).T.rename(columns={
-                '1. open': 'Open',
-                '2. high': 'High',
-                '3. low': 'Low',
-                '4. close': 'Close',
-                '5. volume': 'Volume'
-            }).astype(float)
-            
-            df.index = pd.to_datetime(df.index)
-            return df.sort_index()
+            api_key = st.secrets['alpha_vantage']['api_key']
+            return _POOL.submit(_fetch_live_data, api_key,
+                                int(time.time() // 300))
             
         except Exception as e:
             st.error(f"Market data error: {str(e)}")
@@ -98,6 +200,55 @@ class TradingAssistant:
 # STREAMLIT INTERFACE
 # ======================
 
+@st.cache_data(show_spinner=False)
+def _sample_csv():
+    """Starter dataset, generated once per server process"""
+    base = np.linspace(18000, 18200, 100, dtype=np.float32)
+    ohlc = base[:, None] + np.array([0, 50, -50, 0], dtype=np.float32)
+    np.round(ohlc, 2, out=ohlc)
+    
+    sample = pd.DataFrame({
+        'DateTime': pd.date_range('2024-01-01', periods=100, freq='15min'),
+        'Open': ohlc[:, 0],
+        'High': ohlc[:, 1],
+        'Low': ohlc[:, 2],
+        'Close': ohlc[:, 3],
+        'Volume': np.random.randint(1000, 10000, 100, dtype=np.int32)
+    })
+    return sample.to_csv(index=False)
+
+
+def _sync_panel(assistant):
+    """Live data button and background fetch status"""
+    if st.button("🔄 Sync Live Market Data", 
+                help="Real-time NAS100 prices"):
+        future = assistant.fetch_live_data()
+        if future is not None:
+            st.session_state.fetch_future = future
+            st.rerun()  # Full rerun so the panel starts polling
+    
+    future = st.session_state.get('fetch_future')
+    if future is None:
+        status = st.session_state.pop('sync_status', None)
+        if status == "ok":
+            st.success("Market data synchronized!")
+        elif status:
+            st.error(f"Market data error: {status}")
+        return
+    
+    if not future.done():
+        st.info("Connecting to market feed...")
+        return
+    
+    del st.session_state.fetch_future
+    try:
+        st.session_state.df = future.result().reset_index()
+        st.session_state.sync_status = "ok"
+    except Exception as e:
+        st.session_state.sync_status = str(e)
+    st.rerun()  # Render the dashboard with the new data
+
+
 def main():
     st.set_page_config(
         page_title="NAS100 Trading Terminal",
@@ -106,7 +257,7 @@ def main():
     )
     
     st.title("💹 NAS100 Professional Trading Terminal")
-    assistant = TradingAssistant()
+    assistant = TradingAssistant(get_conn())
     
     # ======================
     # DATA MANAGEMENT
@@ -120,13 +271,9 @@ def main():
                                            help="CSV with DateTime, OHLC, Volume")
             
         with col2:
-            if st.button("🔄 Sync Live Market Data", 
-                        help="Real-time NAS100 prices"):
-                with st.spinner("Connecting to market feed..."):
-                    live_data = assistant.fetch_live_data()
-                    if live_data is not None:
-                        st.session_state.df = live_data.reset_index()
-                        st.success("Market data synchronized!")
+            # Only the sync panel polls while a fetch is pending
+            pending = 'fetch_future' in st.session_state
+            st.fragment(_sync_panel, run_every=0.5 if pending else None)(assistant)
 
     # ======================
     # DATA PROCESSING
@@ -134,13 +281,26 @@ def main():
     df = None
     if uploaded_file:
         try:
-            df = pd.read_csv(uploaded_file)
-            dt_col = next((c for c in df.columns if 'date' in c.lower()), None)
+            columns = pd.read_csv(uploaded_file, nrows=0).columns
+            dt_col = (next((c for c in DATE_COLUMNS if c in columns), None)
+                      or next((c for c in columns if 'date' in c.lower()), None))
             
             if dt_col:
-                # Fixed parentheses syntax
-                df = df.set_index(pd.to_datetime(df[dt_col]))[['Open', 'High', 'Low', 'Close', 'Volume']]
-                st.session_state.df = df.ffill()
+                # Single C-parser pass: dates parsed straight into the index
+                uploaded_file.seek(0)
+                df = pd.read_csv(uploaded_file,
+                                 usecols=[dt_col, *OHLCV_DTYPES],
+                                 parse_dates=[dt_col],
+                                 date_format=CSV_DATE_FORMAT,
+                                 index_col=dt_col,
+                                 dtype=CSV_DTYPES,
+                                 engine='c')
+                if not isinstance(df.index, pd.DatetimeIndex):
+                    # Non-canonical timestamps: fall back to format inference
+                    df.index = pd.to_datetime(df.index)
+                df.ffill(inplace=True)
+                df['Volume'] = df['Volume'].fillna(0).astype('int32')
+                st.session_state.df = df
             else:
                 st.error("⛔ DateTime column not found")
                 
@@ -167,18 +327,23 @@ def main():
             # Technical Analysis
             support, resistance = assistant.detect_levels(df)
             
+            # Rebuild the level tables only when the levels change
+            levels_key = (tuple(support), tuple(resistance))
+            if st.session_state.get('levels_key') != levels_key:
+                st.session_state.support_table = (pd.Series(support, name='Price')
+                                                  .to_frame().style.format("{:.2f}"))
+                st.session_state.resistance_table = (pd.Series(resistance, name='Price')
+                                                     .to_frame().style.format("{:.2f}"))
+                st.session_state.levels_key = levels_key
+            
             col1, col2 = st.columns(2)
             with col1:
                 st.subheader("🛑 Support Levels")
-                st.dataframe(pd.Series(support, name='Price')
-                           .to_frame().style.format("{:.2f}"), 
-                           height=200)
+                st.dataframe(st.session_state.support_table, height=200)
                 
             with col2:
                 st.subheader("🚀 Resistance Levels")
-                st.dataframe(pd.Series(resistance, name='Price')
-                           .to_frame().style.format("{:.2f}"), 
-                           height=200)
+                st.dataframe(st.session_state.resistance_table, height=200)
             
             # Visualization
             st.subheader("Price Action")
@@ -197,7 +362,7 @@ def main():
                 
                 with col1:
                     st.subheader("Current Positions")
-                    positions = pd.read_sql("SELECT * FROM positions", assistant.conn)
+                    positions = _load_positions(assistant.positions_version())
                     st.dataframe(positions.style.format({
                         'timestamp': lambda x: x.strftime("%Y-%m-%d %H:%M"),
                         'entry_price': "{:.2f}"
@@ -205,33 +370,30 @@ def main():
                     
                 with col2:
                     st.subheader("Execute Trade")
+                    # Uploads are re-parsed every rerun, so key them on the file
+                    df_key = ((uploaded_file.file_id, uploaded_file.size)
+                              if uploaded_file else id(df))
+                    if st.session_state.get('df_key') != df_key:
+                        st.session_state.last_close = round(float(df['Close'].iat[-1]), 2)
+                        st.session_state.df_key = df_key
+                    
                     trade_qty = st.number_input("Shares", 1, 1000, 100)
                     trade_price = st.number_input("Price", 
-                                                value=float(df['Close'].iloc[-1]))
+                                                value=st.session_state.last_close)
                     
                     if st.button("📈 Buy NAS100"):
-                        assistant.conn.execute('''
-                            INSERT INTO positions VALUES (?,?,?,?)
-                        ''', (datetime.now(), "NAS100", trade_qty, trade_price))
-                        assistant.conn.commit()
+                        assistant.record_positions([
+                            (datetime.now(), "NAS100", trade_qty, trade_price)
+                        ])
                         st.success("Trade executed successfully!")
 
     # ======================
     # SAMPLE DATA SYSTEM
     # ======================
     with st.expander("📥 Get Starter Data"):
-        sample = pd.DataFrame({
-            'DateTime': pd.date_range('2024-01-01', periods=100, freq='15T'),
-            'Open': np.round(np.linspace(18000, 18200, 100), 2),
-            'High': np.round(np.linspace(18050, 18250, 100), 2),
-            'Low': np.round(np.linspace(17950, 18150, 100), 2),
-            'Close': np.round(np.linspace(18000, 18200, 100), 2),
-            'Volume': np.random.randint(1000, 10000, 100)
-        })
-        
         st.download_button(
             "⬇️ Download Verified Sample",
-            sample.to_csv(index=False),
+            _sample_csv(),
             "nas100_training_data.csv",
             help="Perfectly formatted sample dataset"
         )